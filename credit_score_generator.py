@@ -1,214 +1,492 @@
 import pandas as pd
 import numpy as np
 import json
+import hashlib
+import zlib
 from datetime import datetime
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
 import joblib
 import os
 import sys # Added for command-line arguments
 
+try:
+    import orjson # Faster JSON parsing; falls back to the standard json module
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit # Optional: compiles the per-wallet time-gap reduction below
+except ImportError:
+    njit = None
+
+
+# Number of wallet buckets the input transactions are split into for feature engineering
+N_BUCKETS = 8
+# Inputs with more transactions than this engineer their buckets in parallel worker processes
+PARALLEL_MIN_TRANSACTIONS = 200_000
+
+
+# Timestamps are handled as int64 milliseconds since the epoch
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 86_400_000
+
+# Version of the engineered feature set, part of every feature cache key. Bump it whenever
+# engineer_wallet_features changes so stale cached features are never reused
+FEATURE_VERSION = 1
+
+
+# --- Per-wallet Time Gap Kernel ---
+def mean_tx_gap_hours(wallet_codes, timestamps_ms, n_wallets):
+    """
+    Mean time in hours between consecutive transactions of each wallet, in one pass.
+
+    Args:
+        wallet_codes (np.ndarray): Integer wallet code (0..n_wallets-1) for each transaction.
+        timestamps_ms (np.ndarray): int64 timestamps in milliseconds, sorted within each wallet.
+        n_wallets (int): Number of distinct wallet codes.
+
+    Returns:
+        np.ndarray: Mean gap per wallet code; 0 for wallets with fewer than 2 transactions.
+    """
+    gap_sums = np.zeros(n_wallets, np.float64)
+    gap_counts = np.zeros(n_wallets, np.int64)
+    prev_ts = np.zeros(n_wallets, np.int64)
+    seen = np.zeros(n_wallets, np.bool_)
+    for i in range(wallet_codes.size):
+        c = wallet_codes[i]
+        if seen[c]:
+            gap_sums[c] += timestamps_ms[i] - prev_ts[c]
+            gap_counts[c] += 1
+        prev_ts[c] = timestamps_ms[i]
+        seen[c] = True
+    return gap_sums / np.maximum(gap_counts, 1) / MS_PER_HOUR
+
+
+if njit is not None:
+    mean_tx_gap_hours = njit(cache=True)(mean_tx_gap_hours)
+
 # --- Feature Engineering Function (from Cell 5) ---
-def engineer_wallet_features(transactions_df):
-    # Rename 'userWallet' to 'walletaddress' (Corrected: 'userWallet' with uppercase 'W')
-    if 'userWallet' in transactions_df.columns:
-        transactions_df.rename(columns={'userWallet': 'walletaddress'}, inplace=True)
-    # If 'walletaddress' is still not found after checking for 'userWallet',
-    # and if 'from' and 'to' are present, we might need a more sophisticated way
-    # to derive 'walletaddress' for feature engineering,
-    # or ensure the input JSON always has 'userWallet' or 'walletaddress'.
-    # Given the sample JSON, 'userWallet' is the expected key.
-    elif 'walletaddress' not in transactions_df.columns and 'from' in transactions_df.columns:
+def engineer_wallet_features(transactions_df, latest_timestamp=None):
+    """
+    Aggregates a DataFrame of transactions into one row of features per wallet.
+
+    Args:
+        transactions_df (pd.DataFrame): One row per transaction, with 'actionData' dicts; not modified.
+        latest_timestamp (int): Timestamp (ms) of the latest transaction in the whole input, used
+                                for recency when only a subset of wallets is passed. Defaults to
+                                the latest transaction in transactions_df.
+
+    Returns:
+        pd.DataFrame: float32 features indexed by walletaddress.
+    """
+    # Identify the wallet column (Corrected: 'userWallet' with uppercase 'W')
+    if 'walletaddress' in transactions_df.columns:
+        wallet_col = 'walletaddress'
+    elif 'userWallet' in transactions_df.columns:
+        wallet_col = 'userWallet'
+    elif 'from' in transactions_df.columns:
         # Fallback: if userWallet isn't there, and 'from' is, use 'from' as walletaddress
         # This assumes each transaction's 'from' is the wallet of interest for that row.
         # This is less ideal than explicit 'userWallet' but can prevent KeyErrors
         # if the input format changes unexpectedly.
-        transactions_df['walletaddress'] = transactions_df['from']
+        wallet_col = 'from'
         print("Warning: 'userWallet' not found, using 'from' column as 'walletaddress'.")
-
-
-    # Convert timestamp to datetime and extract date
-    transactions_df['timestamp'] = pd.to_datetime(transactions_df['timestamp'], unit='ms')
-    transactions_df['date'] = transactions_df['timestamp'].dt.date
-
-    # Extract 'amount' and 'assetSymbol' from 'actionData'
-    # Safely extract 'amount' and 'assetSymbol'
-    transactions_df['amount_extracted'] = transactions_df['actionData'].apply(
-        lambda x: x.get('amount') if isinstance(x, dict) and 'amount' in x else None
-    )
-    transactions_df['token_extracted'] = transactions_df['actionData'].apply(
-        lambda x: x.get('assetSymbol') if isinstance(x, dict) and 'assetSymbol' in x else 'UNKNOWN'
-    )
-
-    # Convert amount to numeric, handling potential errors
-    # Use errors='coerce' to turn unparseable values into NaN, then fill NaN
-    transactions_df['amount_numeric'] = pd.to_numeric(transactions_df['amount_extracted'], errors='coerce')
-    # FIX: Addressed FutureWarning for inplace=True
-    transactions_df['amount_numeric'] = transactions_df['amount_numeric'].fillna(0) # Fill NaNs with 0
-
-    # --- Aggregate Features by walletAddress ---
-    # Ensure 'walletaddress' exists before grouping. If not, raise a clear error.
-    if 'walletaddress' not in transactions_df.columns:
-        raise KeyError("After initial processing, 'walletaddress' column is still missing. "
+    else:
+        raise KeyError("'walletaddress' column is missing. "
                        "Ensure your input JSON has 'userWallet' or 'walletaddress' field.")
 
-    wallet_features = transactions_df.groupby('walletaddress').agg(
+    # Extract 'amount' and 'assetSymbol' from the 'actionData' dicts
+    # (.str.get returns None for missing keys and non-dict values)
+    if 'actionData' in transactions_df.columns:
+        action_data = transactions_df['actionData']
+        # Use errors='coerce' to turn unparseable values into NaN, then fill NaN with 0
+        amount_numeric = pd.to_numeric(action_data.str.get('amount'), errors='coerce').fillna(0).to_numpy()
+        token_extracted = action_data.str.get('assetSymbol').fillna('UNKNOWN').astype('category').array
+    else:
+        amount_numeric = np.zeros(len(transactions_df))
+        token_extracted = pd.Categorical(['UNKNOWN'] * len(transactions_df))
+
+    # Work on a new frame holding only the columns used below, so the caller's DataFrame
+    # is never modified and never needs to be copied. Timestamps stay int64 milliseconds
+    # and the day is a day number since the epoch, so all date features below are
+    # integer reductions and arithmetic.
+    # (.array keeps categorical columns categorical without copying them)
+    tx_df = pd.DataFrame({
+        'walletaddress': transactions_df[wallet_col].array,
+        'action': transactions_df['action'].array,
+        'timestamp': transactions_df['timestamp'].to_numpy(dtype=np.int64),
+        'token_extracted': token_extracted,
+        'amount_numeric': amount_numeric
+    })
+    tx_df['date_code'] = tx_df['timestamp'] // MS_PER_DAY
+
+    # Sorting once puts each wallet's transactions in time order for the gap computation.
+    # With numba and categorical wallets, mean gaps come from the compiled kernel;
+    # otherwise from a grouped diff averaged in the aggregation below.
+    tx_df = tx_df.sort_values(['walletaddress', 'timestamp'])
+    use_gap_kernel = njit is not None and isinstance(tx_df['walletaddress'].dtype, pd.CategoricalDtype)
+    if not use_gap_kernel:
+        # Hours since the wallet's previous transaction (NaN for its first one)
+        tx_df['tx_gap_hours'] = tx_df.groupby('walletaddress', observed=True, sort=False)['timestamp'].diff() / MS_PER_HOUR
+
+    # Per-row amount helper columns, one per financial action (NaN for other actions),
+    # so sums, counts and standard deviations per action fit in a single groupby pass.
+    # Maps action -> name used in the 'total_<name>_amount' feature.
+    financial_actions = {
+        'deposit': 'deposit',
+        'borrow': 'borrow',
+        'repay': 'repay',
+        'redeemunderlying': 'redeem',
+        'liquidationcall': 'liquidation_call'
+    }
+    for action in financial_actions:
+        tx_df[f'amount_if_{action}'] = tx_df['amount_numeric'].where(tx_df['action'] == action)
+
+    wallet_agg = tx_df.groupby('walletaddress', observed=True, sort=False).agg(
         total_transactions=('action', 'count'),
-        active_days=('date', lambda x: x.nunique()),
-        duration_days=('date', lambda x: (x.max() - x.min()).days + 1 if x.nunique() > 1 else 1),
-        first_transaction_date=('timestamp', 'min'),
-        last_transaction_date=('timestamp', 'max'),
-        unique_tokens_interacted=('token_extracted', lambda x: x.nunique())
+        active_days=('date_code', 'nunique'),
+        first_active_day=('date_code', 'min'),
+        last_active_day=('date_code', 'max'),
+        last_transaction_ts=('timestamp', 'max'),
+        unique_tokens_interacted=('token_extracted', 'nunique'),
+        **{f'total_{name}_amount': (f'amount_if_{action}', 'sum') for action, name in financial_actions.items()},
+        **{f'count_{action}': (f'amount_if_{action}', 'count') for action in financial_actions},
+        # Standard deviations of amounts (NaN, filled with 0 below, if fewer than 2 transactions of that type)
+        **{f'std_{action}_amount': (f'amount_if_{action}', 'std') for action in ['deposit', 'borrow', 'repay']},
+        # NaN for single-transaction wallets, filled with 0 below
+        **({} if use_gap_kernel else {'avg_time_between_tx_hours': ('tx_gap_hours', 'mean')})
     )
 
-    # Calculate transactions_per_day
-    wallet_features['transactions_per_day'] = wallet_features['total_transactions'] / wallet_features['duration_days']
-    wallet_features['transactions_per_day'].replace([np.inf, -np.inf], 0, inplace=True) # Handle division by zero duration
+    # Features are collected as per-wallet Series/arrays and assembled into a DataFrame
+    # once at the end, instead of inserting columns into a growing frame one by one
+    time_helper_cols = ['first_active_day', 'last_active_day', 'last_transaction_ts']
+    feat = {col: wallet_agg[col] for col in wallet_agg.columns if col not in time_helper_cols}
 
-    # Calculate avg_time_between_tx_hours (if more than 1 transaction)
-    def calculate_avg_time_between_tx(timestamps):
-        if len(timestamps) > 1:
-            timestamps = timestamps.sort_values()
-            time_diffs = (timestamps - timestamps.shift(1)).dropna()
-            return time_diffs.mean().total_seconds() / 3600 # in hours
-        return 0.0
+    if use_gap_kernel:
+        wallet_codes = tx_df['walletaddress'].cat.codes.to_numpy()
+        has_wallet = wallet_codes >= 0 # Code -1 marks a missing wallet address
+        timestamps_ms = tx_df['timestamp'].to_numpy()
+        mean_gaps = mean_tx_gap_hours(wallet_codes[has_wallet], timestamps_ms[has_wallet],
+                                      len(tx_df['walletaddress'].cat.categories))
+        feat['avg_time_between_tx_hours'] = mean_gaps[wallet_agg.index.codes]
 
-    avg_time_between_tx = transactions_df.groupby('walletaddress')['timestamp'].apply(calculate_avg_time_between_tx)
-    wallet_features['avg_time_between_tx_hours'] = avg_time_between_tx.reindex(wallet_features.index).fillna(0)
+    # Inclusive span in days; a single active day gives a duration of 1
+    feat['duration_days'] = wallet_agg['last_active_day'] - wallet_agg['first_active_day'] + 1
 
+    # Calculate transactions_per_day
+    feat['transactions_per_day'] = feat['total_transactions'] / feat['duration_days']
 
     # Calculate last_transaction_recency_days (relative to the latest transaction in the *entire dataset*)
     # This makes recency comparable across all wallets in the input.
-    latest_overall_transaction = transactions_df['timestamp'].max()
-    wallet_features['last_transaction_recency_days'] = (latest_overall_transaction - wallet_features['last_transaction_date']).dt.days
-
-    # Aggregate financial action amounts and counts
-    action_pivot = transactions_df.pivot_table(
-        index='walletaddress',
-        columns='action',
-        values='amount_numeric',
-        aggfunc=['sum', 'count']
-    ).fillna(0)
-
-    # Flatten multi-level columns
-    action_pivot.columns = ['_'.join(col).strip() for col in action_pivot.columns.values]
-
-    # Select and rename relevant columns, add if they don't exist
-    financial_cols = {
-        'sum_deposit': 'total_deposit_amount',
-        'sum_borrow': 'total_borrow_amount',
-        'sum_repay': 'total_repay_amount',
-        'sum_redeemunderlying': 'total_redeem_amount',
-        'sum_liquidationcall': 'total_liquidation_call_amount',
-        'count_deposit': 'count_deposit',
-        'count_borrow': 'count_borrow',
-        'count_repay': 'count_repay',
-        'count_redeemunderlying': 'count_redeemunderlying',
-        'count_liquidationcall': 'count_liquidationcall'
-    }
-
-    for old_col, new_col in financial_cols.items():
-        if old_col in action_pivot.columns:
-            wallet_features[new_col] = action_pivot[old_col]
-        else:
-            wallet_features[new_col] = 0.0 # Add as 0 if action didn't occur for any wallet
+    if latest_timestamp is None:
+        latest_timestamp = tx_df['timestamp'].max()
+    feat['last_transaction_recency_days'] = (latest_timestamp - wallet_agg['last_transaction_ts']) // MS_PER_DAY
 
     # Calculate average amounts for each action type
     # Using np.divide and np.where to handle division by zero more cleanly
-    wallet_features['avg_deposit_amount'] = np.where(wallet_features['count_deposit'] > 0, wallet_features['total_deposit_amount'] / wallet_features['count_deposit'], 0)
-    wallet_features['avg_borrow_amount'] = np.where(wallet_features['count_borrow'] > 0, wallet_features['total_borrow_amount'] / wallet_features['count_borrow'], 0)
-    wallet_features['avg_repay_amount'] = np.where(wallet_features['count_repay'] > 0, wallet_features['total_repay_amount'] / wallet_features['count_repay'], 0)
-    wallet_features['avg_redeem_amount'] = np.where(wallet_features['count_redeemunderlying'] > 0, wallet_features['total_redeem_amount'] / wallet_features['count_redeemunderlying'], 0)
+    feat['avg_deposit_amount'] = np.where(feat['count_deposit'] > 0, feat['total_deposit_amount'] / feat['count_deposit'], 0)
+    feat['avg_borrow_amount'] = np.where(feat['count_borrow'] > 0, feat['total_borrow_amount'] / feat['count_borrow'], 0)
+    feat['avg_repay_amount'] = np.where(feat['count_repay'] > 0, feat['total_repay_amount'] / feat['count_repay'], 0)
+    feat['avg_redeem_amount'] = np.where(feat['count_redeemunderlying'] > 0, feat['total_redeem_amount'] / feat['count_redeemunderlying'], 0)
 
 
-    # Fill potential NaNs from division by zero counts
-    # The np.where already handles this, but keep for robustness against other NaNs
-    wallet_features.fillna(0, inplace=True)
-    wallet_features.replace([np.inf, -np.inf], 0, inplace=True)
-
     # Behavioral Ratios
     # Avoid division by zero by adding a small epsilon or checking for zero
     epsilon = 1e-9 # A small number to avoid division by zero
 
-    wallet_features['borrow_to_deposit_ratio'] = wallet_features['total_borrow_amount'] / (wallet_features['total_deposit_amount'] + epsilon)
-    wallet_features['repay_to_borrow_ratio'] = wallet_features['total_repay_amount'] / (wallet_features['total_borrow_amount'] + epsilon)
-    wallet_features['redeem_to_deposit_ratio'] = wallet_features['total_redeem_amount'] / (wallet_features['total_deposit_amount'] + epsilon)
+    feat['borrow_to_deposit_ratio'] = feat['total_borrow_amount'] / (feat['total_deposit_amount'] + epsilon)
+    feat['repay_to_borrow_ratio'] = feat['total_repay_amount'] / (feat['total_borrow_amount'] + epsilon)
+    feat['redeem_to_deposit_ratio'] = feat['total_redeem_amount'] / (feat['total_deposit_amount'] + epsilon)
 
     # Net Borrow-Repay
-    wallet_features['net_borrow_repay'] = wallet_features['total_borrow_amount'] - wallet_features['total_repay_amount']
+    feat['net_borrow_repay'] = feat['total_borrow_amount'] - feat['total_repay_amount']
+
+    # Single cleanup pass over all features, in float64: replace NaNs (e.g. std/avg gap
+    # of a single transaction) and infinities with 0. Values are then clipped to the
+    # float32 range before the float32 cast (float32 is ample precision for the scoring
+    # and halves memory traffic), so large ratios saturate instead of overflowing to inf.
+    float32_max = np.finfo(np.float32).max
+    feature_values = pd.DataFrame(feat, index=wallet_agg.index).to_numpy(dtype=np.float64, na_value=0.0)
+    np.nan_to_num(feature_values, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    np.clip(feature_values, -float32_max, float32_max, out=feature_values)
+    feature_values = feature_values.astype(np.float32)
+    wallet_features = pd.DataFrame(feature_values, index=wallet_agg.index, columns=list(feat))
 
-    # Standard deviations of amounts (if more than 1 transaction of that type)
-    def safe_std(series):
-        return series.std() if len(series) > 1 else 0.0
+    return wallet_features
 
-    std_amounts = transactions_df.groupby(['walletaddress', 'action'])['amount_numeric'].apply(safe_std).unstack(fill_value=0)
-    for col in ['deposit', 'borrow', 'repay']:
-        if col in std_amounts.columns:
-            wallet_features[f'std_{col}_amount'] = std_amounts[col]
-        else:
-            wallet_features[f'std_{col}_amount'] = 0.0
 
-    # Clean up temporary columns and dates
-    wallet_features.drop(columns=['first_transaction_date', 'last_transaction_date'], inplace=True)
+# --- Transaction Loading ---
+def load_transaction_buckets(json_file_path, n_buckets=1):
+    """
+    Reads transaction records from a JSON array file and shards them into buckets by wallet address.
 
-    # Ensure all columns are numeric
-    for col in wallet_features.columns:
-        if wallet_features[col].dtype == 'object':
-            wallet_features[col] = pd.to_numeric(wallet_features[col], errors='coerce').fillna(0)
+    All transactions of a wallet land in the same bucket, so wallet features can be engineered
+    one bucket at a time.
 
-    return wallet_features
+    Args:
+        json_file_path (str): Path to the input JSON transaction file.
+        n_buckets (int): Number of wallet buckets.
+
+    Returns:
+        tuple: (list of n_buckets lists of records, each with a 'walletaddress' key,
+                timestamp of the latest transaction), or None if the file could not be
+                loaded or contains no transactions.
+    """
+    print(f"Loading transaction data from {json_file_path}...")
+    transaction_buckets = [[] for _ in range(n_buckets)]
+    wallet_sources = set()
+    latest_timestamp = None
+    try:
+        with open(json_file_path, 'rb') as f:
+            raw_json = f.read()
+        records = orjson.loads(raw_json) if orjson is not None else json.loads(raw_json)
+        del raw_json
+
+        for record in records:
+            # --- CRITICAL FIX: Ensure 'walletaddress' exists (Case-Sensitive fix) ---
+            # Resolved per record *before* engineer_wallet_features is called.
+            if 'walletaddress' not in record:
+                if 'userWallet' in record: # Corrected: uppercase 'W'
+                    record['walletaddress'] = record.pop('userWallet')
+                    wallet_sources.add('userWallet')
+                elif 'from' in record: # Fallback if 'userWallet' is not present
+                    record['walletaddress'] = record['from']
+                    wallet_sources.add('from')
+                else:
+                    raise KeyError("Input JSON must contain 'walletaddress', 'userWallet', or 'from' column to identify wallets.")
+            # --- END OF CRITICAL FIX ---
+
+            bucket = zlib.crc32(str(record['walletaddress']).encode()) % n_buckets if n_buckets > 1 else 0
+            transaction_buckets[bucket].append(record)
+            if latest_timestamp is None or record['timestamp'] > latest_timestamp:
+                latest_timestamp = record['timestamp']
+    except KeyError:
+        raise
+    except Exception as e:
+        print(f"Error loading JSON file: {e}")
+        return None
+
+    if latest_timestamp is None:
+        print("Input transaction DataFrame is empty. No scores to generate.")
+        return None
+
+    if 'userWallet' in wallet_sources:
+        print("Renamed 'userWallet' to 'walletaddress'.")
+    if 'from' in wallet_sources:
+        print("Warning: 'userWallet' not found in input data. Using 'from' column as 'walletaddress'. "
+              "Ensure this is the intended behavior for your data.")
+
+    return transaction_buckets, latest_timestamp
+
+
+def engineer_bucket_features(transaction_records, latest_timestamp=None):
+    """
+    Builds a DataFrame from one bucket of transaction records and engineers its wallet features.
+
+    Args:
+        transaction_records (list): Transaction dicts with a 'walletaddress' key.
+        latest_timestamp (int): Timestamp (ms) of the latest transaction in the whole input.
+
+    Returns:
+        pd.DataFrame: Wallet features as returned by engineer_wallet_features.
+    """
+    transactions_df_input = pd.DataFrame(transaction_records)
+
+    # Wallet addresses and actions repeat across many rows; categorical codes make
+    # grouping on them integer-based and shrink their memory footprint
+    transactions_df_input['walletaddress'] = transactions_df_input['walletaddress'].astype('category')
+    transactions_df_input['action'] = transactions_df_input['action'].astype('category')
+
+    return engineer_wallet_features(transactions_df_input, latest_timestamp)
+
+
+# --- Scoring Model Artifacts ---
+# Single-file bundle of the precomputed scoring arrays (see build_model_bundle)
+MODEL_BUNDLE_FILE = 'bundle.npz.joblib'
+# Pickled training artifacts (saved by Cell 6 in the notebook) the bundle is built from
+MODEL_ARTIFACT_FILES = ['scaler.pkl', 'pca.pkl', 'kmeans_model.pkl',
+                        'cluster_score_mapping.pkl', 'trained_feature_columns.pkl']
+
+
+def file_digest(file_path):
+    """
+    Returns a BLAKE2b hex digest of a file's contents, read in 1 MiB blocks.
+
+    Args:
+        file_path (str): Path of the file to hash.
+
+    Returns:
+        str: 32-character hex digest.
+    """
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def model_artifact_digests(models_dir='models/'):
+    """
+    Hashes the pickled training artifacts, so a bundle can be checked against the models it was built from.
+
+    Args:
+        models_dir (str): Directory where the trained model artifacts are saved.
+
+    Returns:
+        dict: File name -> digest, or None for artifacts that do not exist.
+    """
+    return {name: file_digest(os.path.join(models_dir, name)) if os.path.exists(os.path.join(models_dir, name)) else None
+            for name in MODEL_ARTIFACT_FILES}
+
+
+def compose_scoring_model(models_dir='models/'):
+    """
+    Loads the pickled training artifacts and precomputes the arrays used for scoring.
+
+    Args:
+        models_dir (str): Directory containing scaler.pkl, pca.pkl, kmeans_model.pkl,
+                          cluster_score_mapping.pkl and trained_feature_columns.pkl.
+
+    Returns:
+        dict: 'W' and 'b' (scaler + PCA projection), 'cluster_centers', 'cluster_centers_sq_norm'
+              (None without a K-Means model), 'score_lut' (None without a K-Means model or when
+              the score mapping uses other cluster ids), 'cluster_scores' and 'feature_columns'.
+    """
+    scaler = joblib.load(os.path.join(models_dir, 'scaler.pkl'))
+    pca = joblib.load(os.path.join(models_dir, 'pca.pkl'))
+    kmeans_model = joblib.load(os.path.join(models_dir, 'kmeans_model.pkl'))
+    cluster_score_mapping = joblib.load(os.path.join(models_dir, 'cluster_score_mapping.pkl'))
+    trained_feature_columns = joblib.load(os.path.join(models_dir, 'trained_feature_columns.pkl'))
+
+    # StandardScaler is affine and PCA is linear, so scaling followed by PCA
+    # collapses into one projection: pca_features = features @ W.T + b
+    scaler_mean = scaler.mean_ if scaler.with_mean else 0.0
+    scaler_scale = scaler.scale_ if scaler.with_std else 1.0
+    pca_components = pca.components_
+    if pca.whiten:
+        pca_components = pca_components / np.sqrt(pca.explained_variance_)[:, np.newaxis]
+    # Composed in float64, then stored as float32 to match the engineered features
+    W = (pca_components / scaler_scale).astype(np.float32)
+    b = (-(pca_components @ (scaler_mean / scaler_scale + pca.mean_))).astype(np.float32)
+
+    # Score per cluster id: the midpoint of each cluster's score range
+    cluster_scores = {cluster_id: int(round((score_info['min'] + score_info['max']) / 2))
+                      for cluster_id, score_info in cluster_score_mapping.items() if score_info}
+
+    # K-Means predict is argmin ||x - c||^2 == argmin (||c||^2 - 2 x.c)
+    cluster_centers = cluster_centers_sq_norm = score_lut = None
+    if kmeans_model is not None:
+        cluster_centers = kmeans_model.cluster_centers_.astype(np.float32)
+        cluster_centers_sq_norm = (cluster_centers ** 2).sum(axis=1)
+
+        # When the mapping only uses K-Means' own ids 0..n_clusters-1, scores can be
+        # gathered from a lookup table indexed by cluster id (neutral 500 if unmapped)
+        if set(cluster_scores) <= set(range(kmeans_model.n_clusters)):
+            score_lut = np.full(kmeans_model.n_clusters, 500, dtype=np.int32)
+            for cluster_id, score in cluster_scores.items():
+                score_lut[cluster_id] = score
+
+    return {
+        'W': W,
+        'b': b,
+        'cluster_centers': cluster_centers,
+        'cluster_centers_sq_norm': cluster_centers_sq_norm,
+        'score_lut': score_lut,
+        'cluster_scores': cluster_scores,
+        'feature_columns': list(trained_feature_columns)
+    }
+
+
+def build_model_bundle(models_dir='models/'):
+    """
+    Saves the precomputed scoring arrays as a single bundle file next to the pickled artifacts,
+    together with digests of those artifacts so a stale bundle is detected after retraining.
+
+    Args:
+        models_dir (str): Directory where the trained model artifacts are saved.
+
+    Returns:
+        str: Path of the written bundle.
+    """
+    bundle_path = os.path.join(models_dir, MODEL_BUNDLE_FILE)
+    scoring_model = compose_scoring_model(models_dir)
+    scoring_model['artifact_digests'] = model_artifact_digests(models_dir)
+    joblib.dump(scoring_model, bundle_path, compress=3)
+    return bundle_path
+
+
+def load_scoring_model(models_dir='models/'):
+    """
+    Loads the scoring arrays from the model bundle, falling back to the individual pickled
+    artifacts when no bundle has been built or the artifacts changed since it was built
+    (e.g. after retraining). The bundle holds only numpy arrays, so this path needs
+    neither sklearn nor five separate unpickles.
+
+    Args:
+        models_dir (str): Directory where the trained model artifacts are saved.
+
+    Returns:
+        dict: Scoring arrays as returned by compose_scoring_model.
+    """
+    bundle_path = os.path.join(models_dir, MODEL_BUNDLE_FILE)
+    if os.path.exists(bundle_path):
+        scoring_model = joblib.load(bundle_path)
+        artifact_digests = model_artifact_digests(models_dir)
+        # Without any pickled artifacts next to it there is nothing the bundle can be stale against
+        if all(digest is None for digest in artifact_digests.values()) or \
+                scoring_model.get('artifact_digests') == artifact_digests:
+            return scoring_model
+        print(f"Warning: {bundle_path} does not match the model artifacts in {models_dir}. "
+              "Using the artifacts; run with --build-bundle to rebuild it.")
+    return compose_scoring_model(models_dir)
 
 
 # --- The One-Step Scoring Function (from Cell 8) ---
-def generate_wallet_scores_from_json(json_file_path, models_dir='models/'):
+def generate_wallet_scores_from_json(json_file_path, models_dir='models/', cache_dir=None, n_buckets=N_BUCKETS):
     """
     Generates wallet credit scores from a JSON file of transactions using pre-trained models.
 
     Args:
         json_file_path (str): Path to the input JSON transaction file.
         models_dir (str): Directory where the trained model artifacts are saved.
+        cache_dir (str): Directory for cached engineered features, keyed by FEATURE_VERSION and
+                         the input file hash. Defaults to None, which disables caching.
+        n_buckets (int): Number of wallet buckets engineered one at a time, bounding the size
+                         of the intermediate transaction DataFrames.
 
     Returns:
         dict: A dictionary where keys are wallet addresses and values are their credit scores.
               Returns an empty dictionary if any step fails.
     """
     # 1. Load Data
-    print(f"Loading transaction data from {json_file_path}...")
-    try:
-        with open(json_file_path, 'r') as f:
-            transactions_data = json.load(f)
-        transactions_df_input = pd.DataFrame(transactions_data)
-    except Exception as e:
-        print(f"Error loading JSON file: {e}")
-        return {}
-
-    if transactions_df_input.empty:
-        print("Input transaction DataFrame is empty. No scores to generate.")
-        return {}
-
-    # --- CRITICAL FIX: Ensure 'walletaddress' column exists (Case-Sensitive fix) ---
-    # This block was moved from engineer_wallet_features to here
-    # to ensure 'walletaddress' is set *before* engineer_wallet_features is called.
-    if 'walletaddress' not in transactions_df_input.columns:
-        if 'userWallet' in transactions_df_input.columns: # Corrected: uppercase 'W'
-            transactions_df_input.rename(columns={'userWallet': 'walletaddress'}, inplace=True)
-            print("Renamed 'userWallet' to 'walletaddress'.")
-        elif 'from' in transactions_df_input.columns: # Fallback if 'userWallet' is not present
-            transactions_df_input['walletaddress'] = transactions_df_input['from']
-            print("Warning: 'userWallet' not found in input data. Using 'from' column as 'walletaddress'. "
-                  "Ensure this is the intended behavior for your data.")
-        else:
-            raise KeyError("Input JSON must contain 'walletaddress', 'userWallet', or 'from' column to identify wallets.")
-    # --- END OF CRITICAL FIX ---
+    # Engineered features are cached under a hash of the input file's bytes, so
+    # re-scoring an unchanged file skips JSON parsing and feature engineering.
+    wallet_features_input_df = None
+    cache_path = None
+    if cache_dir is not None and os.path.isfile(json_file_path):
+        cache_path = os.path.join(cache_dir, f'features_v{FEATURE_VERSION}_{file_digest(json_file_path)}.pkl')
+        if os.path.exists(cache_path):
+            print(f"Loading cached wallet features from {cache_path}...")
+            try:
+                wallet_features_input_df = joblib.load(cache_path)
+            except Exception as e:
+                print(f"Could not load cached features ({e}); recomputing.")
+                wallet_features_input_df = None
+
+    if wallet_features_input_df is None:
+        loaded = load_transaction_buckets(json_file_path, n_buckets)
+        if loaded is None:
+            return {}
+        transaction_buckets, latest_timestamp = loaded
 
     # 2. Load Pre-trained Models
     try:
-        scaler = joblib.load(os.path.join(models_dir, 'scaler.pkl'))
-        pca = joblib.load(os.path.join(models_dir, 'pca.pkl'))
-        kmeans_model = joblib.load(os.path.join(models_dir, 'kmeans_model.pkl'))
-        cluster_score_mapping = joblib.load(os.path.join(models_dir, 'cluster_score_mapping.pkl'))
-        trained_feature_columns = joblib.load(os.path.join(models_dir, 'trained_feature_columns.pkl'))
+        scoring_model = load_scoring_model(models_dir)
+        W, b = scoring_model['W'], scoring_model['b']
+        cluster_centers = scoring_model['cluster_centers']
+        cluster_centers_sq_norm = scoring_model['cluster_centers_sq_norm']
+        score_lut = scoring_model['score_lut']
+        cluster_scores = scoring_model['cluster_scores']
+        trained_feature_columns = scoring_model['feature_columns']
         print("Pre-trained models loaded successfully.")
     except FileNotFoundError as e:
         print(f"Error: One or more pre-trained models not found in {models_dir}. Missing: {e.filename}")
@@ -218,31 +496,41 @@ def generate_wallet_scores_from_json(json_file_path, models_dir='models/'):
         print(f"Error loading models: {e}")
         return {}
 
-    # 3. Feature Engineering for the input data
-    print("Engineering features for input wallets...")
-    # Pass a copy to engineer_wallet_features to avoid modifying the original DataFrame
-    # if it's used elsewhere, though 'copy()' is already done by the caller.
-    wallet_features_input_df = engineer_wallet_features(transactions_df_input.copy())
+    # 3. Feature Engineering for the input data (unless loaded from the cache)
+    if wallet_features_input_df is None:
+        print("Engineering features for input wallets...")
+        # Buckets hold disjoint wallets, so their features concatenate without re-aggregation
+        if sum(len(bucket_records) for bucket_records in transaction_buckets) > PARALLEL_MIN_TRANSACTIONS:
+            wallet_feature_parts = joblib.Parallel(n_jobs=-1, backend='loky')(
+                joblib.delayed(engineer_bucket_features)(bucket_records, latest_timestamp)
+                for bucket_records in transaction_buckets if bucket_records
+            )
+        else:
+            # Small inputs are not worth the worker start-up and transfer cost
+            wallet_feature_parts = []
+            while transaction_buckets:
+                bucket_records = transaction_buckets.pop(0) # Release each bucket once it is processed
+                if bucket_records:
+                    wallet_feature_parts.append(engineer_bucket_features(bucket_records, latest_timestamp))
+        wallet_features_input_df = pd.concat(wallet_feature_parts).sort_index() # Undo the crc32 bucket order
+
+        if cache_path is not None and not wallet_features_input_df.empty:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                joblib.dump(wallet_features_input_df, cache_path)
+            except OSError as e:
+                print(f"Could not write feature cache to {cache_path}: {e}")
 
     if wallet_features_input_df.empty:
         print("Feature engineering resulted in an empty DataFrame. Cannot proceed with scoring.")
         return {}
 
     # 4. Align features to match training data's columns and order
-    missing_cols_in_input = set(trained_feature_columns) - set(wallet_features_input_df.columns)
-    for c in missing_cols_in_input:
-        wallet_features_input_df[c] = 0.0 # Add missing columns with default 0.0 value
-
-    extra_cols_in_input = set(wallet_features_input_df.columns) - set(trained_feature_columns)
-    if extra_cols_in_input:
-        wallet_features_input_df = wallet_features_input_df.drop(columns=list(extra_cols_in_input))
+    # A single reindex adds missing columns as 0.0, drops extras and applies the training order
+    extra_cols_in_input = wallet_features_input_df.columns.difference(trained_feature_columns)
+    if not extra_cols_in_input.empty:
         print(f"Dropped extra columns from input features: {list(extra_cols_in_input)}")
-
-    try:
-        wallet_features_input_df = wallet_features_input_df[trained_feature_columns]
-    except KeyError as e:
-        print(f"Error: Mismatch in expected feature columns. Missing column: {e}. Check `trained_feature_columns.pkl` and input data.")
-        return {}
+    wallet_features_input_df = wallet_features_input_df.reindex(columns=trained_feature_columns, fill_value=0.0)
 
     # 5. Preprocess Features (Scaling and PCA)
     print("Preprocessing features...")
@@ -250,19 +538,13 @@ def generate_wallet_scores_from_json(json_file_path, models_dir='models/'):
         print("No features to preprocess for input wallets. Skipping prediction.")
         return {}
 
-    wallet_features_input_df.fillna(0, inplace=True)
-    wallet_features_input_df.replace([np.inf, -np.inf], 0, inplace=True)
-
-    scaled_features_input = scaler.transform(wallet_features_input_df)
-
-    if pca.n_components_ == 0:
+    if W.shape[0] == 0:
         print("Warning: PCA resulted in 0 components. Assigning neutral scores.")
-        final_scores = {wallet_address: 500 for wallet_address in wallet_features_input_df.index}
+        final_scores = {wallet_address: 500 for wallet_address in wallet_features_input_df.index.astype(str)}
         return final_scores
-    elif pca.n_components_ == 1:
-        pca_features_input = pca.transform(scaled_features_input).reshape(-1, 1)
-    else:
-        pca_features_input = pca.transform(scaled_features_input)
+
+    # Scaling and PCA in a single matrix multiply (see W and b in step 2)
+    pca_features_input = wallet_features_input_df.to_numpy(dtype=np.float32) @ W.T + b
 
     # 6. Predict Clusters
     print("Predicting clusters for wallets...")
@@ -270,24 +552,22 @@ def generate_wallet_scores_from_json(json_file_path, models_dir='models/'):
         print("No PCA features to predict. Skipping cluster prediction.")
         return {}
 
-    if kmeans_model is None:
+    if cluster_centers is None:
         print("K-Means model not available (e.g., only 1 cluster in training). Assigning neutral scores.")
-        final_scores = {wallet_address: 500 for wallet_address in wallet_features_input_df.index}
+        final_scores = {wallet_address: 500 for wallet_address in wallet_features_input_df.index.astype(str)}
         return final_scores
     else:
-        cluster_labels_input = kmeans_model.predict(pca_features_input)
+        cluster_labels_input = np.argmin(cluster_centers_sq_norm - 2 * pca_features_input @ cluster_centers.T, axis=1)
 
     # 7. Assign Credit Scores
     print("Assigning credit scores...")
-    final_scores = {}
-    for i, wallet_address in enumerate(wallet_features_input_df.index):
-        cluster_id = cluster_labels_input[i]
-        score_info = cluster_score_mapping.get(cluster_id)
-        if score_info:
-            score = (score_info['min'] + score_info['max']) / 2
-            final_scores[wallet_address] = int(round(score))
-        else:
-            final_scores[wallet_address] = 500
+    if score_lut is not None:
+        scores = score_lut[cluster_labels_input]
+    else:
+        scores = np.fromiter((cluster_scores.get(cluster_id, 500) for cluster_id in cluster_labels_input),
+                             dtype=np.int32, count=cluster_labels_input.size)
+    # The wallet index may be categorical; use plain strings as output keys
+    final_scores = dict(zip(wallet_features_input_df.index.astype(str), scores.tolist()))
 
     print("Score generation complete.")
     return final_scores
@@ -297,8 +577,14 @@ if __name__ == '__main__':
     # Expects the path to the input JSON file as a command-line argument
     if len(sys.argv) < 2:
         print('Usage: python credit_score_generator.py <path_to_input_json_file> [output_json_file_name]')
+        print('       python credit_score_generator.py --build-bundle [models_dir]')
         sys.exit(1)
 
+    if sys.argv[1] == '--build-bundle':
+        bundle_path = build_model_bundle(sys.argv[2] if len(sys.argv) > 2 else 'models/')
+        print(f'Model bundle saved to {bundle_path}')
+        sys.exit(0)
+
     input_json_path = sys.argv[1]
     # Default output file name is 'generated_wallet_scores.json'
     output_json_path = sys.argv[2] if len(sys.argv) > 2 else 'generated_wallet_scores.json'